@@ -2,22 +2,25 @@ import sys
 import logging
 import numpy as np
 import cv2
-import csv
 import os
 #from PIL import Image, ImageDraw
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QMenu, QWidget,  QStatusBar, 
                                QGroupBox, QVBoxLayout, QHBoxLayout, QSplitter, QSpinBox, 
                                QPushButton, QSlider, QFileDialog, QColorDialog, QLabel,  
-                               QGraphicsView, QGraphicsItemGroup, QGraphicsProxyWidget, QGraphicsScene, QGraphicsEllipseItem, QGraphicsLineItem, QGraphicsTextItem,
+                               QGraphicsView, QGraphicsItem, QGraphicsItemGroup, QGraphicsProxyWidget, QGraphicsScene, QGraphicsEllipseItem, QGraphicsLineItem, QGraphicsSimpleTextItem, QGraphicsPixmapItem,
                                QListWidget,  QSizePolicy, QTableWidget, QTableWidgetItem, QToolBar, QToolTip )
-from PySide6.QtCore import Qt, QLineF, QRectF, QPointF, QEvent, QTimer
+from PySide6.QtCore import Qt, QLineF, QRectF, QPointF, QEvent, QTimer, QObject, QRunnable, QThreadPool, Signal
 
 from PySide6.QtGui import QAction, QIcon, QImage, QPixmap, QPen, QColor, QPainter, QCursor, QFont, QFontDatabase, QTransform
 from PySide6.QtUiTools import QUiLoader
 from qt_material import QtStyleTools, apply_stylesheet
 import qtawesome as qta
 #import tifffile
+try:
+    import numba  # Optional: compiled image kernels
+except ImportError:
+    numba = None
 
 # Constants
 ROI_RADIUS = 15
@@ -29,6 +32,8 @@ MAXINT8 = 255.0
 COLOR_THEME = "#1de9b6"
 BACKGROUNDCOLOR_THEME = "#31363b"
 ICON_OPTIONS = [{'scale_factor': 1.4, 'color' : COLOR_THEME }]
+MEASUREMENT_DTYPE = np.dtype([('well', 'U3'), ('x_center', 'i4'), ('y_center', 'i4'), ('median', 'i4'),
+                              ('mean', 'f4'), ('stdev', 'f4'), ('mode', 'i4'), ('min', 'i4'), ('max', 'i4')])
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -52,6 +57,258 @@ def get_well_name(row, col):
     return f"{letter}{number}"
 
 
+def read_image(file_path):
+    """Read an image file as a 16-bit array, None if it cannot be decoded."""
+    # Decode from the file bytes, which also handles non-ASCII paths
+    img = cv2.imdecode(np.fromfile(file_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.dtype == np.uint8:
+        # Scale 8-bit intensities to 16-bit in place (255 * 257 = 65535)
+        img = img.astype(np.uint16)
+        np.multiply(img, int(MAXINT16) // int(MAXINT8), out=img)
+    elif img.dtype != np.uint16:
+        img = cv2.convertScaleAbs(img, alpha=(MAXINT16 / MAXINT8))
+        img = img.astype(np.uint16)
+    # Keep rows contiguous so that the ROI slices and reductions run on contiguous memory
+    return np.ascontiguousarray(img)
+
+
+def measure_wells(image, centers, radius, well_names):
+    """Measure the intensities within the circular ROI of each well center (n x 2 array), named row by row."""
+    centers = centers.astype(np.int64)
+    nwells = len(centers)
+
+    if numba is not None:
+        # Fused single pass over every ROI
+        stats = np.empty((nwells, 7), np.int64)
+        well_stats(image, np.ascontiguousarray(centers[:, 0]), np.ascontiguousarray(centers[:, 1]), radius, stats)
+        counts, sums, sums_sq, mins, maxs, modes, medians = stats.T
+    else:
+        counts, sums, sums_sq, mins, maxs, modes, medians = well_stats_numpy(image, centers, radius)
+    names = np.array([name for row in well_names for name in row][:nwells])
+
+    # Leave out the wells without any pixel within the image
+    measured = counts > 0
+    if not measured.all():
+        logger.warning(f"Wells outside the image are not measured: {', '.join(names[~measured])}")
+        names, centers = names[measured], centers[measured]
+        counts, sums, sums_sq, mins, maxs, modes, medians = (
+            stat[measured] for stat in (counts, sums, sums_sq, mins, maxs, modes, medians))
+
+    # Mean and variance from the sum and sum of squares (E[X^2] - E[X]^2), exact in int64
+    means = sums / counts
+    stds = np.sqrt((counts * sums_sq - sums ** 2) / counts ** 2)
+
+    # Fill the measurements column by column
+    measurements = np.empty(len(names), MEASUREMENT_DTYPE)
+    measurements['well'] = names
+    measurements['x_center'] = centers[:, 0]
+    measurements['y_center'] = centers[:, 1]
+    measurements['median'] = medians
+    measurements['mean'] = np.round(means, 1)
+    measurements['stdev'] = np.round(stds, 1)
+    measurements['mode'] = modes
+    measurements['min'] = mins
+    measurements['max'] = maxs
+    return measurements
+
+
+def well_stats_numpy(image, centers, radius):
+    """Get the pixel count, sum, sum of squares, min, max, mode and median of each well ROI (all 0 if empty)."""
+    height, width = image.shape
+
+    # Gather the square ROI of every well at once: (nwells, 2r, 2r)
+    offsets = np.arange(-radius, radius)
+    xs = centers[:, 0, None, None] + offsets[None, None, :]
+    ys = centers[:, 1, None, None] + offsets[None, :, None]
+    # Pixels outside the image are left out of the statistics
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    rois = image[np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)]
+
+    # Keep only the pixels within the circular well: (nwells, npixels in disk)
+    yy, xx = np.ogrid[-radius:radius, -radius:radius]
+    disk = xx * xx + yy * yy <= radius * radius
+    rois, inside = rois[:, disk], inside[:, disk]
+
+    # Per-well statistics, one vectorized reduction each
+    counts = inside.sum(axis=1)
+    # The pixels are cast once to uint32, which holds the square of any 16-bit value
+    masked = np.where(inside, rois, 0).astype(np.uint32)
+    sums = masked.sum(axis=1, dtype=np.int64)
+    sums_sq = np.square(masked, out=masked).sum(axis=1, dtype=np.int64)
+    # Sort each well with the pixels outside the image moved to the end (as the maximum value),
+    # the pixels inside then hold the ranks 0 to count - 1
+    ranked = np.where(inside, rois, np.iinfo(image.dtype).max)
+    ranked.sort(axis=1)
+    wells = np.arange(len(centers))
+    mins = ranked[:, 0].copy()
+    maxs = np.where(inside, rois, 0).max(axis=1)
+    empty = counts == 0
+    mins[empty] = 0
+
+    # Mode from a bincount per well over its own range, the sorted pixels inside starting at the minimum
+    modes = np.zeros(len(centers), np.int64)
+    for k in np.flatnonzero(counts):
+        values = ranked[k, :counts[k]]
+        modes[k] = int(values[0]) + np.bincount(values - values[0]).argmax()
+    # The median is the mean of the values at the two middle ranks (the same one for odd counts)
+    lower = ranked[wells, (counts - 1) // 2].astype(np.int64)
+    upper = ranked[wells, counts // 2].astype(np.int64)
+    medians = (lower + upper) // 2
+    medians[empty] = 0
+    return counts, sums, sums_sq, mins, maxs, modes, medians
+
+
+def merge_measurements(results, image_names):
+    """Merge the measurements of several images, in order, with the image name as first field."""
+    dtype = np.dtype([('image', f'U{max(map(len, image_names))}')] + MEASUREMENT_DTYPE.descr)
+    merged = np.empty(sum(map(len, results)), dtype)
+    start = 0
+    for measurements, image_name in zip(results, image_names):
+        block = merged[start:start + len(measurements)]
+        block['image'] = image_name
+        for name in MEASUREMENT_DTYPE.names:
+            block[name] = measurements[name]
+        start += len(block)
+    return merged
+
+
+def get_csv_format(dtype):
+    """Get the CSV format of each field of a measurements array."""
+    formats = {'U': '%s', 'i': '%d', 'f': '%.1f'}
+    return [formats[dtype[name].kind] for name in dtype.names]
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def scale_clip_u16(levels, v_min, v_max, out):
+        """Rescale 1D uint16 levels between v_min and v_max into out in a single pass."""
+        # Fixed-point scale factor (Q16), rounded up so that v_max maps to 65535
+        span = max(v_max - v_min, 1)
+        mul = -(-(int(MAXINT16) << 16) // span)
+        for i in range(levels.shape[0]):
+            diff = min(max(np.int64(levels[i]) - v_min, 0), span)
+            out[i] = (diff * mul) >> 16
+
+    @numba.njit(cache=True, nogil=True)
+    def well_stats(img, cx, cy, radius, stats):
+        """Fill stats (n x 7) with the pixel count, sum, sum of squares, min, max, mode and median of each well ROI (all 0 if empty)."""
+        height, width = img.shape
+        hist = np.zeros(65536, np.int32)  # shared by the wells, cleared over each well's range
+        for k in range(len(cx)):
+            # One pass over the disk, pixels outside the image are left out
+            count, s, s2, v_min, v_max = 0, 0, 0, 65535, 0
+            for dy in range(-radius, radius):
+                y = cy[k] + dy
+                if y < 0 or y >= height:
+                    continue
+                for dx in range(-radius, radius):
+                    x = cx[k] + dx
+                    if dx * dx + dy * dy > radius * radius or x < 0 or x >= width:
+                        continue
+                    v = np.int64(img[y, x])
+                    count += 1
+                    s += v
+                    s2 += v * v
+                    hist[v] += 1
+                    v_min = min(v_min, v)
+                    v_max = max(v_max, v)
+            if count == 0:
+                stats[k, :] = 0
+                continue
+
+            # Mode (lowest value on ties) and median (mean of the two middle ranks) from the histogram
+            mode, lower, upper, cum = v_min, -1, -1, 0
+            for v in range(v_min, v_max + 1):
+                if hist[v] > hist[mode]:
+                    mode = v
+                cum += hist[v]
+                if lower < 0 and cum > (count - 1) // 2:
+                    lower = v
+                if upper < 0 and cum > count // 2:
+                    upper = v
+            hist[v_min:v_max + 1] = 0
+            stats[k, 0] = count
+            stats[k, 1] = s
+            stats[k, 2] = s2
+            stats[k, 3] = v_min
+            stats[k, 4] = v_max
+            stats[k, 5] = mode
+            stats[k, 6] = (lower + upper) // 2
+
+
+class WellGridItem(QGraphicsItem):
+    """Graphics item painting the ROI circles of all the wells in a single pass."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rects = []
+        self.bounds = QRectF()
+        self.pen = QPen(QColor('red'))
+        self.pen.setCosmetic(True)
+
+    def set_wells(self, bboxes):
+        """Set the ROI circles from their bounding boxes (n x 4 array of x, y, width, height)."""
+        self.prepareGeometryChange()
+        # Move the existing rectangles, only allocate them when the number of wells changes
+        if len(self.rects) != len(bboxes):
+            self.rects = [QRectF() for _ in range(len(bboxes))]
+        for rect, (x, y, width, height) in zip(self.rects, bboxes.tolist()):
+            rect.setRect(x, y, width, height)
+
+        if self.rects:
+            x_min, y_min = bboxes[:, :2].min(axis=0)
+            x_max, y_max = (bboxes[:, :2] + bboxes[:, 2:]).max(axis=0)
+            margin = self.pen.widthF()
+            self.bounds = QRectF(x_min - margin, y_min - margin, x_max - x_min + 2 * margin, y_max - y_min + 2 * margin)
+        else:
+            self.bounds = QRectF()
+        self.update()
+
+    def set_color(self, color):
+        """Set the color of the ROI circles."""
+        if color != self.pen.color():
+            self.pen.setColor(color)
+            self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(self.pen)
+        for rect in self.rects:
+            painter.drawEllipse(rect)
+
+
+class MeasureSignals(QObject):
+    """Signals emitted by a measurement job."""
+    done = Signal(int, object)  # job id, measurements
+
+
+class MeasureJob(QRunnable):
+    """Measure the wells of one or more images on a thread pool worker."""
+
+    def __init__(self, job_id, images, centers, radius, well_names, image_names=None):
+        super().__init__()
+        self.job_id = job_id
+        # Snapshots of the grid and of the image list, the images are only read
+        self.images = list(images)
+        self.centers = centers.copy()
+        self.radius = radius
+        self.well_names = well_names
+        self.image_names = image_names  # set to merge the measurements of several images
+        self.signals = MeasureSignals()
+
+    def run(self):
+        results = [measure_wells(image, self.centers, self.radius, self.well_names) for image in self.images]
+        if self.image_names is None:
+            measurements = results[0]
+        else:
+            measurements = merge_measurements(results, self.image_names)
+        self.signals.done.emit(self.job_id, measurements)
+
+
 class RuntimeStylesheets(QMainWindow, QtStyleTools):
 
     def __init__(self):
@@ -89,27 +346,48 @@ class WellGridApp(QMainWindow):
         self.image_paths = []
         self.current_image = None
         self.original_image = None
+        self.pixmap_item = None  # persistent scene item displaying the current image
         self.roi_radius = ROI_RADIUS
         self.nrows, self.ncols = ROWS, COLUMNS
-        self.grid_offset = [0, 0]
-        self.grid_spacing = [0, 0]
-        self.corners = []
+        # Well names (3-character long) in the grid layout, indexed as [row][col]
+        self._well_names = [[get_well_name(r, c) for c in range(self.ncols)] for r in range(self.nrows)]
+        self.grid_offset = np.zeros(2, np.int32)
+        self.grid_spacing = np.zeros(2, np.int32)
+        self.corners = np.zeros((3, 2))  # A01, A12, H01 (x, y)
+        self._n_corners = 0
         self.corner_points = []
         self.corner_lines = []
-        self.circles = []
+        self.corner_line_pen = QPen(Qt.GlobalColor.yellow, 2)
+        self.grid_item = None  # single item drawing all the ROI circles
+        self.well_centers = np.empty((0, 2), np.float32)
+        self.well_bboxes = np.empty((ROWS * COLUMNS, 4))  # (x, y, width, height) of each ROI circle
         self.labels = []
-        self.measurements = []
+        self.label_group = None  # off-scene group batching the label items
+        self._label_color = None
+        self._grid_key = None  # geometry inputs of the last drawn grid
+        self.measurements = np.empty(0, MEASUREMENT_DTYPE)
         self.roi_color = QColor('red')
         self.saturation_fraction = SATURATION
         self.defining_grid = False
         self.grid_defined = False
         self.magnifier_item = None
+        self.magnifier_mask = None  # circular mask of the full-size magnifier
+        self.pending_mouse_pos = None  # last cursor position not yet processed
         self.spacing_increment = 1
+        self._qimage_buf = None  # uint16 output buffer for adjust_image, shared with _qimage
+        self._qimage = None      # QImage displaying _qimage_buf without copy
+        self._adjusted_cache = None  # last adjusted image
+        self._adjusted_key = None    # (image id, saturation) of the cached image
+        self._image_cdf = None       # cumulative intensity histogram of the current image
+        self._image_cdf_key = None   # image id of the cached histogram
+        self._lut = None             # raw to adjusted intensity lookup table
+        self._lut_key = None         # (image id, saturation) of the lookup table
+        self._lut_max = None         # adjusted intensity of the image maximum
 
     def check_grid(self):
-        logger.debug(f"ROI circles   : {len(self.circles)}")
+        logger.debug(f"ROI circles   : {len(self.well_centers)}")
         logger.debug(f"ROI labels    : {len(self.labels)}")
-        logger.debug(f"corners       : {len(self.corners)}")
+        logger.debug(f"corners       : {self._n_corners}")
         logger.debug(f"corner lines  : {len(self.corner_lines)}")
         logger.debug(f"corner points : {len(self.corner_points)}")
         logger.debug(f"grid offset   : {self.grid_offset}")
@@ -133,6 +411,8 @@ class WellGridApp(QMainWindow):
         
         # Add scene for image display
         self.image_scene = QGraphicsScene()
+        # Few items that move often (grid, magnifier), a BSP index only costs rebuilds
+        self.image_scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
         self.image_group = QGraphicsItemGroup()  
         self.image_scene.addItem(self.image_group)
         self.grid_group = QGraphicsItemGroup()
@@ -355,6 +635,23 @@ class WellGridApp(QMainWindow):
         self.measure_button.clicked.connect(self.measure_grid)
         layout.addWidget(self.measure_button)
 
+        # Debounce the re-measurement while the grid is being adjusted
+        self.measure_timer = QTimer(self)
+        self.measure_timer.setSingleShot(True)
+        self.measure_timer.setInterval(200)
+        self.measure_timer.timeout.connect(self.measure_grid)
+
+        # Measurement jobs run one at a time on a worker thread, only the latest one updates the table
+        self.measure_pool = QThreadPool(self)
+        self.measure_pool.setMaxThreadCount(1)
+        self.measure_jobs = {}
+        self.measure_job_id = 0
+
+        # Measure all images button
+        self.measure_all_button = QPushButton("Measure All")
+        self.measure_all_button.clicked.connect(self.measure_all)
+        layout.addWidget(self.measure_all_button)
+
         # Save as CSV button
         self.save_grid_button = QPushButton("Save as CSV")
         self.save_grid_button.clicked.connect(self.save_csv)
@@ -386,6 +683,7 @@ class WellGridApp(QMainWindow):
         #self.decrease_button.setToolTip("Decrease grid spacing (width|height = horizontal|vertical).")
 
         self.measure_button.setToolTip("Measure the grid intensity values within each well.")
+        self.measure_all_button.setToolTip("Measure the grid intensity values within each well of all the loaded images.")
         self.save_grid_button.setToolTip("Save the grid measurements of the current image to a CSV file.")
         self.reset_button.setToolTip("Reset the app to its initial state.")
 
@@ -402,33 +700,52 @@ class WellGridApp(QMainWindow):
         self.image_view.viewport().setMouseTracking(True)
         self.image_view.viewport().installEventFilter(self)
 
+        # Coalesce mouse moves so the cursor views update at most once per frame (~60 Hz)
+        self.mouse_move_timer = QTimer(self)
+        self.mouse_move_timer.setSingleShot(True)
+        self.mouse_move_timer.setInterval(16)
+        self.mouse_move_timer.timeout.connect(self.process_mouse_move)
+
     def eventFilter(self, obj, event):
         """Filter mouse events to update the magnifier and status bar."""
         if event.type() == QEvent.Type.MouseMove and self.current_image is not None:
-            pos = event.position()
-            scene_pos = self.image_view.mapToScene(pos.toPoint())  # Convert QPointF to QPoint
-            x, y = int(scene_pos.x()), int(scene_pos.y())
-            is_cursor_inframe = (0 <= x < self.current_image.shape[1] and 0 <= y < self.current_image.shape[0])
+            self.pending_mouse_pos = event.position()
+            if not self.mouse_move_timer.isActive():
+                self.mouse_move_timer.start()
 
-            if is_cursor_inframe:
-                self.update_status_bar(x, y)
+        return super().eventFilter(obj, event)
 
-                # Ensure magnifier is triggered during grid definition
-                if self.defining_grid:
-                    logger.trace("Magnifier being updated")
-                    self.update_magnifier(x, y)  # Ensure magnifier is updated during grid definition
+    def process_mouse_move(self):
+        """Update the magnifier and status bar for the last cursor position."""
+        pos = self.pending_mouse_pos
+        self.pending_mouse_pos = None
+        if pos is None or self.current_image is None:
+            return
 
-            if self.defining_grid and not is_cursor_inframe and self.magnifier_item:
-                self.image_scene.removeItem(self.magnifier_item)
-                self.magnifier_item = None
+        scene_pos = self.image_view.mapToScene(pos.toPoint())  # Convert QPointF to QPoint
+        x, y = int(scene_pos.x()), int(scene_pos.y())
+        is_cursor_inframe = (0 <= x < self.current_image.shape[1] and 0 <= y < self.current_image.shape[0])
 
-        return super().eventFilter(obj, event)
+        if is_cursor_inframe:
+            # Look up the saturation once for both cursor views
+            lut = self.get_saturation_lut(self.current_image)
+            self.update_status_bar(x, y, lut)
+
+            # Ensure magnifier is triggered during grid definition
+            if self.defining_grid:
+                logger.trace("Magnifier being updated")
+                self.update_magnifier(x, y, lut)  # Ensure magnifier is updated during grid definition
+
+        if self.defining_grid and not is_cursor_inframe and self.magnifier_item:
+            self.image_scene.removeItem(self.magnifier_item)
+            self.magnifier_item = None
 
     def on_mouse_press(self, event):
         """Handle mouse press to define grid corners."""
-        if len(self.corners) < 3 and self.defining_grid:
+        if self._n_corners < 3 and self.defining_grid:
             scene_pos = self.image_view.mapToScene(event.position().toPoint())
-            self.corners.append((scene_pos.x(), scene_pos.y()))
+            self.corners[self._n_corners] = (scene_pos.x(), scene_pos.y())
+            self._n_corners += 1
 
             corner_ellipse = QGraphicsEllipseItem(scene_pos.x() - 5, scene_pos.y() - 5, 10, 10)
             corner_ellipse.setPen(QPen(Qt.GlobalColor.red))
@@ -437,7 +754,7 @@ class WellGridApp(QMainWindow):
             self.corner_points.append(corner_ellipse)
             self.image_group.addToGroup(corner_ellipse)
 
-            if len(self.corners) == 3:
+            if self._n_corners == 3:
                 self.grid_defined = True
                 self.defining_grid = False
                 self.define_grid_button.setText("Define Grid")
@@ -465,12 +782,13 @@ class WellGridApp(QMainWindow):
         file_dialog = QFileDialog(self)
         file_path, _ = file_dialog.getOpenFileName(self, "Open Image", "", "Image Files (*.png *.jpg *.tif)")
         if file_path:
+            img = read_image(file_path)
+            if img is None:
+                logger.error(f"Could not read image {file_path}")
+                return
             self.image_paths.append(file_path)
-            img = cv2.imread(file_path, cv2.IMREAD_UNCHANGED)
-            if img.dtype != np.uint16:
-                img = cv2.convertScaleAbs(img, alpha=(MAXINT16 / MAXINT8))
-                img = img.astype(np.uint16)
             self.images.append(img)
+            self.invalidate_adjusted_image()
             self.image_list.addItem(os.path.basename(file_path))
 
             if len(self.images) == 1:
@@ -486,7 +804,9 @@ class WellGridApp(QMainWindow):
             #self.erase_grid()
 
             self.current_image = self.images[selected_idx]
-            self.original_image = self.current_image.copy()
+            # Images are never modified in place, no need to copy
+            self.original_image = self.current_image
+            self.invalidate_adjusted_image()
             self.update_image()
 
             # Ensure the grid persists and is adjusted for the new image
@@ -498,24 +818,18 @@ class WellGridApp(QMainWindow):
         """Update the displayed image after any changes."""
         logger.debug("Updating image.")
         if self.current_image is not None:
-            adjusted_image = self.adjust_image(self.current_image)
-            height, width = adjusted_image.shape
-            bytes_per_line = width * 2
-            q_image = QImage(adjusted_image.data, width, height, bytes_per_line, QImage.Format.Format_Grayscale16)
-            pixmap = QPixmap.fromImage(q_image)
-            # Clear the image group (not the whole scene)
-            for item in self.image_group.childItems():
-                self.image_group.removeFromGroup(item)
-                self.image_scene.removeItem(item)
-        
-            # Add the new pixmap to the image group
-            pixmap_item = self.image_scene.addPixmap(pixmap)
-            self.image_group.addToGroup(pixmap_item)
-            
+            # adjust_image fills the buffer backing self._qimage
+            self.adjust_image(self.current_image)
+            pixmap = QPixmap.fromImage(self._qimage)
+
+            # Swap the pixmap of the image item, the grid items are left untouched
+            if self.pixmap_item is None:
+                self.pixmap_item = QGraphicsPixmapItem()
+                self.image_group.addToGroup(self.pixmap_item)
+            self.pixmap_item.setPixmap(pixmap)
+
             # Adjust the view
             self.image_view.setSceneRect(QRectF(pixmap.rect()))
-            self.draw_orientation_lines()
-            self.draw_grid()
 
     def zoom_in(self):
         """Zoom in the image."""
@@ -542,8 +856,11 @@ class WellGridApp(QMainWindow):
                                                    "PNG Files (*.png);;JPG Files (*.jpg);;TIFF Files (*.tif);;")
         
         if file_path:
-            # Load the original image
-            original_image = QImage(current_image_path)
+            # Wrap the loaded 16-bit image without copying it or reading the file again,
+            # the array stays referenced by the image list while painting
+            image = self.current_image
+            original_image = QImage(image.data, image.shape[1], image.shape[0], image.strides[0],
+                                    QImage.Format_Grayscale16)
             
             # Create a new image with the same size and format as the original
             result_image = QImage(original_image.size(), QImage.Format_ARGB32)
@@ -579,27 +896,105 @@ class WellGridApp(QMainWindow):
         logger.trace("Adjusting spacing increment.")
         self.spacing_increment = value
 
+    def invalidate_adjusted_image(self):
+        """Discard the cached adjusted image."""
+        self._adjusted_cache = None
+        self._adjusted_key = None
+        self._lut = None
+        self._lut_key = None
+        self._lut_max = None
+
+    def get_image_cdf(self, image):
+        """Return the cumulative intensity histogram (65536 bins) of a uint16 image, cached per image."""
+        if self._image_cdf is None or self._image_cdf_key != id(image):
+            logger.trace("Computing image intensity histogram.")
+            hist = np.bincount(image.ravel(), minlength=int(MAXINT16) + 1)
+            self._image_cdf = np.cumsum(hist)
+            self._image_cdf_key = id(image)
+        return self._image_cdf
+
+    def ensure_display_buffers(self, shape):
+        """Allocate the adjusted image buffer and the QImage sharing it, once per image shape."""
+        # Reuse the buffer as long as the image shape does not change
+        if self._qimage_buf is None or self._qimage_buf.shape != shape:
+            height, width = shape
+            self._qimage_buf = np.empty(shape, np.uint16)
+            self._qimage = QImage(self._qimage_buf.data, width, height, self._qimage_buf.strides[0],
+                                  QImage.Format.Format_Grayscale16)
+
     def adjust_image(self, image):
-        """Adjust the image based on the saturation settings."""
+        """Adjust the image based on the saturation settings (cached until image or saturation change)."""
+        key = (id(image), self.saturation_fraction)
+        if self._adjusted_cache is not None and self._adjusted_key == key:
+            return self._adjusted_cache
+
         logger.trace("Adjusting image saturation.")
-        v_min, v_max = np.percentile(image, (0, 100 - self.saturation_fraction * 100))
-        return np.clip((image - v_min) * MAXINT16 / (v_max - v_min), 0, MAXINT16).astype(np.uint16)
+        self.ensure_display_buffers(image.shape)
+        lut = self.get_saturation_lut(image)
+        # Single gather through the lookup table, straight into the QImage buffer
+        lut.take(image, out=self._qimage_buf, mode='clip')
+
+        self._adjusted_cache = self._qimage_buf
+        self._adjusted_key = key
+        return self._adjusted_cache
+
+    def get_saturation_lut(self, image):
+        """Return the lookup table mapping raw to adjusted intensities, cached per image and saturation."""
+        key = (id(image), self.saturation_fraction)
+        if self._lut is None or self._lut_key != key:
+            logger.trace("Rebuilding saturation lookup table.")
+            levels = np.arange(int(MAXINT16) + 1, dtype=np.uint16)
+            self._lut = self.apply_saturation_bounds(levels, *self.get_saturation_bounds(image))
+            self._lut_key = key
+            # The adjusted maximum follows from the raw maximum, no pass over the image
+            cdf = self.get_image_cdf(image)
+            self._lut_max = int(self._lut[np.searchsorted(cdf, cdf[-1])])
+        return self._lut
+
+    def get_saturation_bounds(self, image):
+        """Return the (v_min, v_max) intensity bounds of the image for the current saturation."""
+        # Minimum and (1 - saturation) quantile, looked up in the cached histogram
+        cdf = self.get_image_cdf(image)
+        v_min = int(np.searchsorted(cdf, 1))
+        v_max = int(np.searchsorted(cdf, (1 - self.saturation_fraction) * image.size))
+        return v_min, v_max
+
+    def apply_saturation_bounds(self, image, v_min, v_max, out=None):
+        """Rescale the intensity levels (1D array) between v_min and v_max to the uint16 range."""
+        if out is None:
+            out = np.empty(image.shape, np.uint16)
+
+        if numba is not None:
+            # Fused scale and clip, reading the image and writing the output once
+            scale_clip_u16(image, v_min, v_max, out)
+        else:
+            # Clip then scale with fixed-point integer arithmetic: (px - v_min) * mul >> 16
+            span = max(v_max - v_min, 1)
+            mul = -(-(int(MAXINT16) << 16) // span)
+            diff = np.subtract(image, v_min, dtype=np.int64)
+            np.clip(diff, 0, span, out=diff)
+            np.multiply(diff, mul, out=diff)
+            np.right_shift(diff, 16, out=diff)
+            out[...] = diff
+        return out
 
     def adjust_saturation(self, value):
         """Adjust image saturation and refresh."""
         logger.trace(f"Adjusting saturation to {value}.")
         self.saturation_fraction = value / 1000.0
+        self.invalidate_adjusted_image()
         self.update_image()
 
-    def update_status_bar(self, x, y):
+    def update_status_bar(self, x, y, lut=None):
         """Update the status bar with the current cursor position and intensity."""
         logger.trace(f"Updating status bar for position: ({x}, {y}).")
         if self.current_image is None:
             return
         else:
-            adjusted_image = self.adjust_image(self.current_image)
-            intensity = adjusted_image[y, x]
-            max_intensity = np.max(adjusted_image)
+            if lut is None:
+                lut = self.get_saturation_lut(self.current_image)
+            intensity = lut[self.current_image[y, x]]
+            max_intensity = self._lut_max
             relative_intensity = (intensity / max_intensity) * 100
             percentile_intensity = (intensity / MAXINT16) * 100
 
@@ -607,33 +1002,35 @@ class WellGridApp(QMainWindow):
                                         f"Relative: {relative_intensity:.2f}% | "
                                         f"Percentile: {percentile_intensity:.2f}%")
 
-    def update_magnifier(self, x, y):
+    def update_magnifier(self, x, y, lut=None):
         """Update magnifier view at the current cursor position."""
         logger.trace(f"Updating magnifier at position: ({x}, {y}).")
         if self.current_image is None:
             return
         else:
-            adjusted_image = self.adjust_image(self.current_image)
+            if lut is None:
+                lut = self.get_saturation_lut(self.current_image)
             region_size = 30
             zoom_factor = 3
 
-            x_min, x_max = max(0, x - region_size), min(adjusted_image.shape[1], x + region_size)
-            y_min, y_max = max(0, y - region_size), min(adjusted_image.shape[0], y + region_size)
+            x_min, x_max = max(0, x - region_size), min(self.current_image.shape[1], x + region_size)
+            y_min, y_max = max(0, y - region_size), min(self.current_image.shape[0], y + region_size)
 
-            region = adjusted_image[y_min:y_max, x_min:x_max]
+            # Only rescale the magnified region, through the lookup table of the whole image
+            region = self.current_image[y_min:y_max, x_min:x_max]
+            region = lut.take(region, mode='clip')
             region_resized = cv2.resize(region, (region.shape[1] * zoom_factor, region.shape[0] * zoom_factor),
                                         interpolation=cv2.INTER_NEAREST)
 
-            # Create circular mask
-            mask = np.zeros_like(region_resized)
-            center = (region_resized.shape[1] // 2, region_resized.shape[0] // 2)
-            radius = region_size * zoom_factor
-            cv2.circle(mask, center, radius, MAXINT16, thickness=-1)
-
-            region_resized = cv2.bitwise_and(region_resized, mask)
+            # Apply the circular mask in place
+            mask = self.get_magnifier_mask(region_resized.shape, region_size * zoom_factor)
+            cv2.bitwise_and(region_resized, mask, dst=region_resized)
 
+            # QImage needs C-contiguous rows, with the actual row stride as bytes per line
+            if not region_resized.flags['C_CONTIGUOUS']:
+                region_resized = np.ascontiguousarray(region_resized)
             height, width = region_resized.shape
-            bytes_per_line = width * 2
+            bytes_per_line = region_resized.strides[0]
             q_image = QImage(region_resized.data, width, height, bytes_per_line, QImage.Format.Format_Grayscale16)
             pixmap = QPixmap.fromImage(q_image)
 
@@ -645,6 +1042,20 @@ class WellGridApp(QMainWindow):
             self.magnifier_item.setPos(x - region_size * zoom_factor, y - region_size * zoom_factor)
             self.magnifier_item.setZValue(1000)
 
+    def get_magnifier_mask(self, shape, radius):
+        """Return the circular magnifier mask for the given shape (cached at full magnifier size)."""
+        if self.magnifier_mask is not None and self.magnifier_mask.shape == shape:
+            return self.magnifier_mask
+
+        mask = np.zeros(shape, np.uint16)
+        center = (shape[1] // 2, shape[0] // 2)
+        cv2.circle(mask, center, radius, MAXINT16, thickness=-1)
+
+        # Regions clipped at the image border are smaller, only keep the full-size mask
+        if shape == (2 * radius, 2 * radius):
+            self.magnifier_mask = mask
+        return mask
+
     ##############
     #### GRID ####
     ##############
@@ -742,6 +1153,7 @@ class WellGridApp(QMainWindow):
         logger.trace(f"Setting ROI radius to {value}.")
         self.roi_radius = value
         self.update_grid()
+        self.schedule_measure_grid()
 
     def change_roi_color(self):
         """Open a color dialog to change the ROI color."""
@@ -799,7 +1211,7 @@ class WellGridApp(QMainWindow):
     def reset_grid(self):
         """Reset the grid and clear only the grid-related items from the scene."""
         logger.info("Resetting grid.")
-        self.corners=[]
+        self._n_corners = 0
         if self.grid_defined:
             logger.info("Removing existing grid.")
             self.grid_defined = False
@@ -816,17 +1228,18 @@ class WellGridApp(QMainWindow):
             self.grid_spacing[0] = 0   # Reset the width adjustment to 0
             self.grid_spacing[1] += value  # Adjust only height
         self.update_grid()  # Redraw the grid with updated spacing
+        self.schedule_measure_grid()
 
     def move_grid(self, dx, dy):
         """Move the entire grid by adjusting the offset."""
         logger.debug(f"Moving grid by dx={dx}, dy={dy}.")
-        self.grid_offset[0] += dx #* self.grid_spacing[0]
-        self.grid_offset[1] += dy #* self.grid_spacing[1]
+        self.grid_offset += (dx, dy)
         self.update_grid()  # Redraw the grid with updated offset
+        self.schedule_measure_grid()
 
     def draw_orientation_lines(self):
         """Draw orientation lines between grid corners."""
-        if len(self.corners) == 3:
+        if self._n_corners == 3:
             logger.debug("Draw the corner orientation lines.")
             a1, a12, h1 = self.corners
             
@@ -839,13 +1252,13 @@ class WellGridApp(QMainWindow):
             self.corner_lines = []
             # Draw horizontal and vertical lines
             hline = QGraphicsLineItem(QLineF(a1[0], a1[1], a12[0], a12[1]))
-            hline.setPen(QPen(Qt.GlobalColor.yellow, 2))
+            hline.setPen(self.corner_line_pen)
             self.corner_lines.append(hline)
             self.grid_group.addToGroup(hline)
 
 
             vline = QGraphicsLineItem(QLineF(a1[0], a1[1], h1[0], h1[1]))
-            vline.setPen(QPen(Qt.GlobalColor.yellow, 2))
+            vline.setPen(self.corner_line_pen)
             self.corner_lines.append(vline)
             self.grid_group.addToGroup(vline)
 
@@ -853,117 +1266,159 @@ class WellGridApp(QMainWindow):
     def draw_grid(self):
         """Draw the grid based on defined corners and grid offset/spacing."""
         logger.debug("Drawing grid.")
-        if len(self.corners) != 3:
+        if self._n_corners != 3:
+            return
+
+        # Skip the recomputation when none of the geometry inputs changed (only recolor)
+        grid_key = (self.corners.tobytes(), tuple(self.grid_offset), tuple(self.grid_spacing), self.roi_radius)
+        if grid_key == self._grid_key:
+            self.set_grid_color(self.roi_color)
             return
+        self._grid_key = grid_key
 
-        a1, a12, h1 = np.array(self.corners[0]), np.array(self.corners[1]), np.array(self.corners[2])
+        a1, a12, h1 = self.corners
 
         # Adjust the row and column vectors based on grid_spacing
         row_vec = (h1 - a1) / (self.nrows - 1)
         col_vec = (a12 - a1) / (self.ncols - 1)
 
-        # Apply the grid offset (translation)
-        a1 += np.array(self.grid_offset)
-    
-        # Clear the existing grid-related items
-        for item in self.circles + self.labels:
-            self.grid_group.removeFromGroup(item)
-            self.image_scene.removeItem(item)
-
-        # Clear the scene and reset the tracking lists
-        self.circles = []
-        self.labels = []
-
-        # Redraw the grid
-        for i in range(self.nrows):
-            for j in range(self.ncols):
-                # Compute the center, applying grid_spacing[0] to x (column) and grid_spacing[1] to y (row)
-                center = a1 + i * (row_vec + [0, self.grid_spacing[1]]) + j * (col_vec + [self.grid_spacing[0], 0])
-
-                # Draw the circle
-                circ = QGraphicsEllipseItem(center[0] - self.roi_radius, center[1] - self.roi_radius,
-                                            2 * self.roi_radius, 2 * self.roi_radius)
-                circ.setPen(QPen(self.roi_color))
-                self.circles.append(circ)  # Add circle to the list
-                self.grid_group.addToGroup(circ)
-
-                # Get the well name (3-character long)
-                well_name = get_well_name(i, j)
-
-                # Create text item and center it on the circle
-                text = QGraphicsTextItem(well_name)
-                text_width = text.boundingRect().width()
-                text_height = text.boundingRect().height()
-                text.setPos(center[0] - text_width / 2, center[1] - text_height / 2)
-                text.setDefaultTextColor(self.roi_color)
-                self.labels.append(text)  # Add label to the list
-                self.grid_group.addToGroup(text)
+        # Apply the grid offset (translation), without modifying the stored corner
+        a1 = a1 + self.grid_offset
+
+        # Compute all the centers at once (nrows x ncols x 2), applying grid_spacing[0] to x (column)
+        # and grid_spacing[1] to y (row)
+        row_step = row_vec + (0, self.grid_spacing[1])
+        col_step = col_vec + (self.grid_spacing[0], 0)
+        rows = np.arange(self.nrows)[:, None, None]
+        cols = np.arange(self.ncols)[None, :, None]
+        centers = a1 + rows * row_step + cols * col_step
+
+        # Create the labels once, later redraws only move them
+        if len(self.labels) != self.nrows * self.ncols:
+            self.create_labels()
+        for text, (x, y) in zip(self.labels, centers.reshape(-1, 2).tolist()):
+            # Center the text item on the circle
+            rect = text.boundingRect()
+            text.setPos(x - rect.width() / 2, y - rect.height() / 2)
+
+        # Draw all the circles with a single item
+        self.well_centers = centers.reshape(-1, 2)
+        if self.grid_item is None:
+            self.grid_item = WellGridItem()
+            self.grid_group.addToGroup(self.grid_item)
+        # ROI bounding boxes, written into the preallocated array
+        np.subtract(self.well_centers, self.roi_radius, out=self.well_bboxes[:, :2])
+        self.well_bboxes[:, 2:] = 2 * self.roi_radius
+        self.grid_item.set_wells(self.well_bboxes)
+        self.set_grid_color(self.roi_color)
 
         ## Add the grid group to the scene if not already added
         #if self.grid_group.scene() is None:
         #    self.image_scene.addItem(self.grid_group)
 
 
+    def create_labels(self):
+        """Create the well labels, parented to a group added to the scene in a single call."""
+        if self.label_group is not None:
+            self.grid_group.removeFromGroup(self.label_group)
+            self.image_scene.removeItem(self.label_group)
+
+        self.labels = []
+        self.label_group = QGraphicsItemGroup()
+        for name in (name for row in self._well_names for name in row):
+            text = QGraphicsSimpleTextItem(name)
+            text.setBrush(self.roi_color)
+            text.setParentItem(self.label_group)
+            self.labels.append(text)
+        self._label_color = QColor(self.roi_color)
+        self.grid_group.addToGroup(self.label_group)
+
+    def set_grid_color(self, color):
+        """Recolor the ROI circles and the well labels, when the color changed."""
+        if self.grid_item is not None:
+            self.grid_item.set_color(color)
+        if color != self._label_color:
+            for text in self.labels:
+                text.setBrush(color)
+            self._label_color = QColor(color)
+
     def measure_grid(self):
         """Measure the grid wells and collect intensity data."""
         logger.info("Measuring grid intensities.")
-        if self.current_image is None or len(self.circles) == 0:
+        if self.current_image is None or len(self.well_centers) == 0:
             return
 
-        self.measurements = []
-        for i, circ in enumerate(self.circles):
-            if circ:  # Check if the circle item is still valid
-                center = circ.rect().center()
-                center_x, center_y = int(center.x()), int(center.y())
-                radius = int(self.roi_radius)
-
-                x_min, x_max = max(0, center_x - radius), min(self.current_image.shape[1], center_x + radius)
-                y_min, y_max = max(0, center_y - radius), min(self.current_image.shape[0], center_y + radius)
-
-                roi_pixels = self.current_image[y_min:y_max, x_min:x_max]
-                mean_intensity = np.mean(roi_pixels)
-                median_intensity = np.median(roi_pixels)
-                std_dev = np.std(roi_pixels)
-                mode = np.argmax(np.bincount(roi_pixels.ravel()))
-                min_intensity = np.min(roi_pixels)
-                max_intensity = np.max(roi_pixels)
-
-                self.measurements.append({
-                    'well': get_well_name(i // self.ncols, i % self.ncols),
-                    'x_center': center_x,
-                    'y_center': center_y,
-                    'median': int(median_intensity),
-                    'mean': round(mean_intensity, 1),
-                    'stdev': round(std_dev, 1),
-                    'mode': int(mode),
-                    'min': int(min_intensity),
-                    'max': int(max_intensity)
-                })
-
+        self.start_measure_job([self.current_image])
+
+    def start_measure_job(self, images, image_names=None):
+        """Measure the grid wells of the images on a worker thread, to keep the interface responsive."""
+        self.measure_job_id += 1
+        job = MeasureJob(self.measure_job_id, images, self.well_centers, int(self.roi_radius),
+                         self._well_names, image_names)
+        job.signals.done.connect(self.on_measure_done)
+        self.measure_jobs[job.job_id] = job
+        self.measure_pool.start(job)
+
+    def on_measure_done(self, job_id, measurements):
+        """Show the measurements of a finished job, unless a newer one was started since."""
+        self.measure_jobs.pop(job_id, None)
+        if job_id != self.measure_job_id:
+            logger.debug(f"Ignoring the outdated measurements of job {job_id}.")
+            return
+        self.measurements = measurements
         self.update_measurements_table()
 
+    def schedule_measure_grid(self):
+        """Re-measure the grid once it stops moving, if the current image was measured already."""
+        # Batch measurements (with an image column) are only refreshed by Measure All
+        if len(self.measurements) and 'image' not in self.measurements.dtype.names:
+            self.measure_timer.start()  # restarts the countdown on every grid adjustment
+
+    def measure_all(self):
+        """Measure the grid wells of all the loaded images and collect intensity data."""
+        logger.info("Measuring grid intensities of all images.")
+        if not self.images or len(self.well_centers) == 0:
+            return
+
+        # A pending re-measurement of the current image would replace the batch results, and starting
+        # a new job already outdates the single-image job in flight
+        self.measure_timer.stop()
+        # The images are already decoded, they are measured in turn on the worker thread
+        self.start_measure_job(self.images, [os.path.basename(path) for path in self.image_paths])
+
     def update_measurements_table(self):
         """Update the measurements table with new data."""
         logger.debug("Updating measurements table.")
-        if not self.measurements:
+        if len(self.measurements) == 0:
             return
 
-        self.measurements_table.setColumnCount(len(self.measurements[0]))
-        self.measurements_table.setRowCount(len(self.measurements))
-
-        headers = list(self.measurements[0].keys())
-        self.measurements_table.setHorizontalHeaderLabels(headers)
-
-        for i, measurement in enumerate(self.measurements):
-            for j, (key, value) in enumerate(measurement.items()):
-                self.measurements_table.setItem(i, j, QTableWidgetItem(str(value)))
-
-        self.measurements_table.resizeColumnsToContents()
+        headers = self.measurements.dtype.names
+        # Convert each column to strings at once, the loop only creates the cells
+        columns = [self.measurements[name].astype(str).tolist() for name in headers]
+
+        # Fill the table without repainting or emitting signals for every cell
+        table = self.measurements_table
+        sorting = table.isSortingEnabled()
+        table.setSortingEnabled(False)
+        table.setUpdatesEnabled(False)
+        table.blockSignals(True)
+        try:
+            table.setColumnCount(len(headers))
+            table.setRowCount(len(self.measurements))
+            table.setHorizontalHeaderLabels(headers)
+            for j, column in enumerate(columns):
+                for i, value in enumerate(column):
+                    table.setItem(i, j, QTableWidgetItem(value))
+            table.resizeColumnsToContents()
+        finally:
+            table.blockSignals(False)
+            table.setUpdatesEnabled(True)
+            table.setSortingEnabled(sorting)
 
     def save_csv(self):
         """Save the measurements to a CSV file."""
         logger.info("Saving measurements to CSV.")
-        if not self.measurements or not self.image_paths:
+        if len(self.measurements) == 0 or not self.image_paths:
             return
 
         current_image_path = self.image_paths[self.image_list.currentRow()]
@@ -972,15 +1427,14 @@ class WellGridApp(QMainWindow):
         file_dialog = QFileDialog(self)
         file_path, _ = file_dialog.getSaveFileName(self, "Save CSV", default_csv_path, "CSV Files (*.csv)")
         if file_path:
-            with open(file_path, mode='w', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=self.measurements[0].keys())
-                writer.writeheader()
-                writer.writerows(self.measurements)
+            np.savetxt(file_path, self.measurements, fmt=get_csv_format(self.measurements.dtype), delimiter=',',
+                       header=','.join(self.measurements.dtype.names), comments='')
             logger.info(f"Measurements saved to {file_path}")
 
     def reset_app(self):
         """Reset the application to its initial state."""
         logger.debug("Resetting the application.")
+        self.measure_job_id += 1  # ignore the measurements still running
         self.init_variables()
         self.image_list.clear()
         for item in self.image_group.childItems():